@@ -1,431 +1,627 @@
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List
-from datetime import datetime
+import sys
+
+# prefer the newer SQLite bundled with pysqlite3-binary; it has to replace the
+# stdlib module before aiosqlite imports it. Platforms without a wheel keep sqlite3.
+try:
+    import pysqlite3
+    sys.modules["sqlite3"] = pysqlite3
+except ImportError:
+    pass
+
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, HTTPException, Body, Depends, Query, Request, Response
+from pydantic import BaseModel
+from typing import Annotated, Optional, List
+from functools import wraps
+from collections import OrderedDict
+from aiosqlitepool import SQLiteConnectionPool
+from redis import RedisError
+import redis.asyncio as redis
+import aiosqlite
+import hmac
+import logging
+import msgspec
+import orjson
+import os
+import re
 import sqlite3
-import threading
+
+logger = logging.getLogger("fflike")
 
 DB_FILE = "like_exchange.db"
-app = FastAPI(title="Manual Like Exchange API")
+DB_POOL_SIZE = 5
+OPEN_PAGE_SIZE = 50
+OPEN_PAGE_MAX = 200
+SQL_CACHE_SIZE = 256
+
+# response cache is optional: without REDIS_URL every read goes straight to SQLite
+REDIS_URL = os.environ.get("REDIS_URL")
+CACHE_TTL = 30
+CACHE_TIMEOUT = 0.1
+# every cached /requests/open page key is tracked here so writes can drop them all
+OPEN_PAGES_KEY = "fflike:req:open:pages"
+# invalidation bumps a "<key>:ver" counter; it only has to outlive any in-flight read
+CACHE_VERSION_TTL = 3600
+UID_CACHE_SIZE = 100_000
+
+# group commit: writes queued within WRITE_BATCH_WINDOW seconds share one COMMIT
+WRITE_BATCH_WINDOW = 0.003
+WRITE_BATCH_SIZE = 64
+
+# required: the app refuses to start without an admin secret configured, and an
+# empty one would let an empty "secret" through compare_digest
+ADMIN_SECRET = os.environ["ADMIN_SECRET"].encode()
+if not ADMIN_SECRET:
+    raise RuntimeError("ADMIN_SECRET must not be empty")
+
+# requests.status is stored as a small int and mapped back to its name in API
+# responses; codes are positions, so only ever append. requests.region points at
+# the regions table instead, which assigns an id to each new name on first use
+STATUS_OPEN, STATUS_CLAIMED, STATUS_COMPLETED = 0, 1, 2
+STATUS_NAMES = ("open", "claimed", "completed")
+
+# applied to every connection as soon as it is opened: WAL lets readers run
+# alongside the writer, synchronous=NORMAL skips the per-commit fsync in WAL mode
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",
+)
+
+# ---------- SQL ----------
+# one canonical string per query so every call hits the per-connection statement cache
+# timestamps are generated by SQLite itself, as UTC ISO-8601 with milliseconds
+SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ','now')"
+SQL_GET_USER_ID = "SELECT id FROM users WHERE telegram_id = ?"
+SQL_GET_USER = "SELECT id, telegram_id, username, points, is_vip, created_at FROM users WHERE telegram_id = ?"
+SQL_GET_POINTS = "SELECT points FROM users WHERE telegram_id = ?"
+SQL_INSERT_USER = f"INSERT OR IGNORE INTO users (telegram_id, username, created_at) VALUES (?, ?, {SQL_NOW})"
+SQL_DEDUCT_POINTS = "UPDATE users SET points = points - ? WHERE id = ? AND points >= ?"
+SQL_AWARD_POINTS = "UPDATE users SET points = points + ? WHERE id = ?"
+SQL_ADD_POINTS_BY_TG = "UPDATE users SET points = points + ? WHERE telegram_id = ? RETURNING id"
+SQL_INSERT_REGION = "INSERT OR IGNORE INTO regions (name) VALUES (?)"
+SQL_INSERT_REQUEST = f"INSERT INTO requests (owner_id, uid, region, proof_url, points_requested, status, created_at) VALUES (?, ?, (SELECT id FROM regions WHERE name = ?), ?, ?, {STATUS_OPEN}, {SQL_NOW})"
+# /requests/open is rendered to JSON by SQLite itself; the handler passes the string through.
+# aggregate order is only guaranteed by an ORDER BY inside json_group_array (SQLite 3.44+);
+# older builds rely on SQLite feeding the subquery's rows in order, which it does because
+# the LIMIT keeps it from being flattened and it runs as a co-routine
+SQL_OPEN_ORDER = " ORDER BY created_at DESC, id" if sqlite3.sqlite_version_info >= (3, 44, 0) else ""
+SQL_LIST_OPEN = (
+    "SELECT json_group_array(json_object("
+    "'id', id, 'owner_id', owner_id, 'uid', uid, 'region', region, 'proof_url', proof_url, "
+    f"'points_requested', points_requested, 'status', '{STATUS_NAMES[STATUS_OPEN]}', 'claimed_by', claimed_by, 'created_at', created_at){SQL_OPEN_ORDER}) "
+    "FROM (SELECT r.id, r.owner_id, r.uid, g.name AS region, r.proof_url, r.points_requested, r.created_at, r.claimed_by "
+    "FROM requests r LEFT JOIN regions g ON g.id = r.region "
+    # created_at isn't unique (writes in one batch can share a millisecond), so id breaks
+    # ties to keep OFFSET pages stable; the index's trailing rowid already serves that order
+    f"WHERE r.status = {STATUS_OPEN} ORDER BY r.created_at DESC, r.id LIMIT ? OFFSET ?)"
+)
+SQL_GET_REQUEST_STATE = "SELECT status, owner_id, claimed_by FROM requests WHERE id = ?"
+SQL_CLAIM_REQUEST = f"UPDATE requests SET status = {STATUS_CLAIMED}, claimed_by = ? WHERE id = ? AND status = {STATUS_OPEN} AND owner_id <> ?"
+SQL_COMPLETE_REQUEST = f"UPDATE requests SET status = {STATUS_COMPLETED}, claim_proof_url = ?, completed_at = {SQL_NOW} WHERE id = ? AND status = {STATUS_CLAIMED} AND claimed_by = ? RETURNING points_requested"
+
+# pool connections only ever read; the writer connection runs both sets
+SQL_READS = (
+    SQL_GET_USER_ID,
+    SQL_GET_USER,
+    SQL_GET_POINTS,
+    SQL_LIST_OPEN,
+    SQL_GET_REQUEST_STATE,
+)
+SQL_WRITES = (
+    SQL_INSERT_USER,
+    SQL_DEDUCT_POINTS,
+    SQL_AWARD_POINTS,
+    SQL_ADD_POINTS_BY_TG,
+    SQL_INSERT_REGION,
+    SQL_INSERT_REQUEST,
+    SQL_CLAIM_REQUEST,
+    SQL_COMPLETE_REQUEST,
+)
 
 # ---------- DB helpers ----------
 def init_db():
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    # autocommit mode: the schema work below runs in one explicit transaction instead
+    conn = sqlite3.connect(DB_FILE, isolation_level=None)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE,
-                    username TEXT,
-                    points INTEGER DEFAULT 0,
-                    is_vip INTEGER DEFAULT 0,
-                    created_at TEXT
-                )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS requests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    owner_id INTEGER,
-                    uid TEXT,
-                    region TEXT,
-                    proof_url TEXT,
-                    points_requested INTEGER,
-                    status TEXT,
-                    created_at TEXT,
-                    claimed_by INTEGER,
-                    claim_proof_url TEXT,
-                    completed_at TEXT
-                )""")
-    conn.commit()
+    # BEGIN IMMEDIATE serialises workers starting together; each one re-reads the
+    # schema under the write lock, so only the first migrates
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute(f"""CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        telegram_id INTEGER UNIQUE,
+                        username TEXT,
+                        points INTEGER DEFAULT 0,
+                        is_vip INTEGER DEFAULT 0,
+                        created_at TEXT DEFAULT ({SQL_NOW})
+                    )""")
+        c.execute("""CREATE TABLE IF NOT EXISTS regions (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT UNIQUE
+                    )""")
+        # databases created before status/region became integer codes are rebuilt below
+        columns = {row[1]: row[2] for row in c.execute("PRAGMA table_info(requests)")}
+        migrate = columns.get("status") == "TEXT"
+        if migrate:
+            check_requests_migratable(c)
+            c.execute("ALTER TABLE requests RENAME TO requests_text")
+        c.execute(f"""CREATE TABLE IF NOT EXISTS requests (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        owner_id INTEGER,
+                        uid TEXT,
+                        region INTEGER,
+                        proof_url TEXT,
+                        points_requested INTEGER,
+                        status INTEGER NOT NULL DEFAULT 0,
+                        created_at TEXT DEFAULT ({SQL_NOW}),
+                        claimed_by INTEGER,
+                        claim_proof_url TEXT,
+                        completed_at TEXT
+                    )""")
+        if migrate:
+            # regions were stored upper-cased free text; each distinct name gets an id
+            c.execute("INSERT OR IGNORE INTO regions (name) SELECT DISTINCT upper(region) FROM requests_text WHERE region IS NOT NULL")
+            status_case = " ".join(f"WHEN '{name}' THEN {code}" for code, name in enumerate(STATUS_NAMES))
+            c.execute(f"""INSERT INTO requests
+                          SELECT id, owner_id, uid, (SELECT id FROM regions WHERE name = upper(region)), proof_url, points_requested,
+                                 CASE status {status_case} END, created_at, claimed_by, claim_proof_url, completed_at
+                          FROM requests_text""")
+            c.execute("DROP TABLE requests_text")
+        # users.telegram_id is already covered by the index backing its UNIQUE constraint
+        c.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_created ON requests(status, created_at DESC)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_requests_claimed_by ON requests(claimed_by)")
+        c.execute("COMMIT")
+    except BaseException:
+        c.execute("ROLLBACK")
+        conn.close()
+        raise
+    c.execute("ANALYZE")
+    conn.close()
+
+def check_requests_migratable(c):
+    # every stored status must have a code: refuse to start rather than drop or invent data
+    placeholders = ", ".join("?" * len(STATUS_NAMES))
+    statuses = [row[0] for row in c.execute(
+        f"SELECT DISTINCT status FROM requests WHERE status IS NULL OR status NOT IN ({placeholders})", STATUS_NAMES)]
+    if statuses:
+        raise RuntimeError(f"cannot migrate requests: unknown statuses {statuses}")
+
+async def connect(writer=False):
+    conn = await aiosqlite.connect(DB_FILE, cached_statements=SQL_CACHE_SIZE)
+    try:
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        # prepare the statements this connection will run so it starts with a warm cache
+        for sql in SQL_READS:
+            await conn.execute(sql, (0,) * sql.count("?"))
+        if writer:
+            # take the write lock up front so busy_timeout applies instead of
+            # failing on a lock upgrade; the rollback discards the dummy writes
+            await conn.execute("BEGIN IMMEDIATE")
+            for sql in SQL_WRITES:
+                await conn.execute(sql, (0,) * sql.count("?"))
+            await conn.rollback()
+    except BaseException:
+        await conn.close()
+        raise
     return conn
 
-DB = init_db()
-DB_LOCK = threading.Lock()
-
-def db_execute(query, params=(), fetch=False):
-    with DB_LOCK:
-        cur = DB.cursor()
-        cur.execute(query, params)
-        if fetch:
-            return cur.fetchall()
-        DB.commit()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    app.state.pool = SQLiteConnectionPool(connect, pool_size=DB_POOL_SIZE)
+    app.state.write_conn = await connect(writer=True)
+    app.state.write_queue = asyncio.Queue()
+    app.state.writer_task = asyncio.create_task(writer(app.state.write_conn, app.state.write_queue))
+    app.state.writer_task.add_done_callback(writer_done)
+    app.state.redis = None
+    if REDIS_URL:
+        app.state.redis = redis.from_url(REDIS_URL, socket_timeout=CACHE_TIMEOUT, socket_connect_timeout=CACHE_TIMEOUT)
+        app.state.cache_store_script = app.state.redis.register_script(SCRIPT_CACHE_STORE)
+        app.state.cache_invalidate_script = app.state.redis.register_script(SCRIPT_CACHE_INVALIDATE)
+    yield
+    app.state.writer_task.cancel()
+    try:
+        await app.state.writer_task
+    except asyncio.CancelledError:
+        pass
+    except Exception:
+        # already logged by writer_done
+        pass
+    fail_pending_writes(app.state.write_queue)
+    await app.state.write_conn.close()
+    await app.state.pool.close()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+
+app = FastAPI(title="Manual Like Exchange API", lifespan=lifespan)
+
+async def db_execute(query, params=(), fetch="all"):
+    # reads only, on a pool connection; writes go through run_write() instead
+    # fetch: "one" for a single row, "all" for every row
+    async with app.state.pool.connection() as conn:
+        cur = await conn.execute(query, params)
+        if fetch == "one":
+            return await cur.fetchone()
+        return await cur.fetchall()
+
+async def run_write(op):
+    # op(conn) runs on the writer's connection and may raise (e.g. HTTPException)
+    # to undo just its own statements; the result is returned once the batch commits
+    if app.state.writer_task.done():
+        raise writer_unavailable()
+    future = asyncio.get_running_loop().create_future()
+    app.state.write_queue.put_nowait((op, future))
+    return await future
+
+def writer_unavailable():
+    return HTTPException(status_code=503, detail="Database writer unavailable")
+
+def fail_pending_writes(queue, batch=()):
+    # nothing else will ever resolve these once the writer is gone
+    pending = list(batch)
+    while not queue.empty():
+        pending.append(queue.get_nowait())
+    for _, future in pending:
+        if not future.done():
+            future.set_exception(writer_unavailable())
+
+def writer_done(task):
+    if task.cancelled():
+        return
+    logger.error("database writer stopped", exc_info=task.exception())
+    fail_pending_writes(app.state.write_queue)
+
+async def writer(conn, queue):
+    # sole owner of the write connection: each batch is one BEGIN IMMEDIATE ... COMMIT,
+    # with a savepoint per op so a failing op doesn't take the rest of the batch down
+    while True:
+        batch = [await queue.get()]
+        try:
+            await asyncio.sleep(WRITE_BATCH_WINDOW)
+            while len(batch) < WRITE_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            outcomes = []
+            try:
+                await conn.execute("BEGIN IMMEDIATE")
+                for op, future in batch:
+                    await conn.execute("SAVEPOINT op")
+                    try:
+                        outcomes.append((future, await op(conn), None))
+                    except Exception as e:
+                        await conn.execute("ROLLBACK TO op")
+                        outcomes.append((future, None, e))
+                    await conn.execute("RELEASE op")
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                outcomes = [(future, None, e) for _, future in batch]
+        except BaseException:
+            # cancelled or the connection broke: fail the in-flight batch before dying
+            fail_pending_writes(queue, batch)
+            raise
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+# telegram_id -> users.id never changes once registered (users are never deleted),
+# so each worker keeps its own LRU and skips the lookup on repeat callers
+_uid_cache: "OrderedDict[int, int]" = OrderedDict()
+
+def cache_user_id(telegram_id, user_id):
+    _uid_cache[telegram_id] = user_id
+    _uid_cache.move_to_end(telegram_id)
+    if len(_uid_cache) > UID_CACHE_SIZE:
+        _uid_cache.popitem(last=False)
+
+async def resolve_user_id(telegram_id, conn=None):
+    user_id = _uid_cache.get(telegram_id)
+    if user_id is not None:
+        _uid_cache.move_to_end(telegram_id)
+        return user_id
+    if conn is not None:
+        # inside a write batch the row may come from a register op in the same,
+        # not yet committed batch; callers cache it only once run_write returns
+        cur = await conn.execute(SQL_GET_USER_ID, (telegram_id,))
+        row = await cur.fetchone()
+        return row[0] if row else None
+    row = await db_execute(SQL_GET_USER_ID, (telegram_id,), fetch="one")
+    # unknown users are not cached so they resolve as soon as they register
+    if row is None:
         return None
+    cache_user_id(telegram_id, row[0])
+    return row[0]
+
+# ---------- Cache helpers ----------
+# redis failures are swallowed: a broken cache only ever costs a trip to SQLite.
+# a miss reads the entry's version along with it, and the value is only stored if
+# that version is unchanged; writes bump it after they commit, so a read that
+# started before the commit can't put its stale value back
+
+# KEYS: entry, version, group (optional); ARGV: version seen on the miss ("" if unset), value, ttl
+SCRIPT_CACHE_STORE = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+if KEYS[3] then
+    redis.call('SADD', KEYS[3], KEYS[1])
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+end
+return 1
+"""
+
+# KEYS: exact keys, then group sets, each followed by its version key; ARGV: key count, version ttl
+SCRIPT_CACHE_INVALIDATE = """
+for i = 1, #KEYS, 2 do
+    redis.call('INCR', KEYS[i + 1])
+    redis.call('EXPIRE', KEYS[i + 1], ARGV[2])
+    if (i + 1) / 2 > tonumber(ARGV[1]) then
+        for _, member in ipairs(redis.call('SMEMBERS', KEYS[i])) do
+            redis.call('DEL', member)
+        end
+    end
+    redis.call('DEL', KEYS[i])
+end
+return 1
+"""
+
+def cache_version_key(key):
+    return f"{key}:ver"
+
+def cached(key, ttl_seconds=CACHE_TTL, group=None):
+    # entries in a group share the group's version, since they're only ever invalidated together
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(**kwargs):
+            cache_key = key.format(**kwargs)
+            version_key = cache_version_key(group or cache_key)
+            version = None
+            if app.state.redis is not None:
+                try:
+                    hit, version = await app.state.redis.mget(cache_key, version_key)
+                    version = version or b""
+                except RedisError:
+                    hit = None
+                if hit is not None:
+                    return Response(hit, media_type="application/json")
+            result = await func(**kwargs)
+            content = result.body if isinstance(result, Response) else orjson.dumps(result)
+            # version stays None if the lookup failed: without it the store can't be checked
+            if version is not None:
+                keys = [cache_key, version_key] + ([group] if group is not None else [])
+                try:
+                    await app.state.cache_store_script(keys=keys, args=[version, content, ttl_seconds])
+                except RedisError:
+                    pass
+            return Response(content, media_type="application/json")
+        return wrapper
+    return decorator
+
+async def cache_invalidate(*keys, groups=()):
+    # exact keys plus the members of each group set, in one atomic script; never scans the keyspace
+    if app.state.redis is None:
+        return
+    script_keys = []
+    for key in (*keys, *groups):
+        script_keys += [key, cache_version_key(key)]
+    try:
+        await app.state.cache_invalidate_script(keys=script_keys, args=[len(keys), CACHE_VERSION_TTL])
+    except RedisError:
+        pass
 
 # ---------- Schemas ----------
-class RegisterIn(BaseModel):
-    telegram_id: int
-    username: Optional[str] = None
+# request bodies are msgspec structs decoded in one pass by body(); ReqOut only documents the listing
+# proof links only need to look like http(s) URLs, so a length cap and one compiled regex suffice.
+# the pattern is also published in the OpenAPI schema, so it sticks to syntax JS regexes share;
+# Python's $ still matches before a trailing newline, which check_proof_url() rejects
+ProofUrl = Annotated[str, msgspec.Meta(pattern=r"^https?://\S+$", max_length=2048)]
 
-class CreateRequestIn(BaseModel):
-    telegram_id: int
-    uid: str = Field(..., json_schema_extra={"example": "2476897412"})
-    region: str = Field(..., json_schema_extra={"example": "IND"})
-    proof_url: HttpUrl
-    points: int = Field(..., ge=1, le=100)
+def check_proof_url(name, url):
+    if url.endswith("\n"):
+        raise ValueError(f"{name} must not end with a newline")
 
-class ClaimIn(BaseModel):
-    telegram_id: int
-    request_id: int
-
-class ConfirmIn(BaseModel):
-    telegram_id: int
-    request_id: int
-    claim_proof_url: HttpUrl
-
-class ReqOut(BaseModel):
-    id: int
-    owner_id: int
-    uid: str
-    region: str
-    proof_url: HttpUrl
-    points_requested: int
-    status: str
-    claimed_by: Optional[int]
-    created_at: str
-
-# ---------- Endpoints ----------
-@app.post("/register")
-def register(payload: RegisterIn):
-    user = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if user:
-        return {"ok": True, "message": "Already registered"}
-    db_execute(
-        "INSERT INTO users (telegram_id, username, created_at) VALUES (?, ?, ?)",
-        (payload.telegram_id, payload.username or "", datetime.utcnow().isoformat())
-    )
-    return {"ok": True, "message": "Registered"}
-
-@app.get("/me/{telegram_id}")
-def me(telegram_id: int):
-    row = db_execute("SELECT id, telegram_id, username, points, is_vip, created_at FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
-    if not row:
-        raise HTTPException(status_code=404, detail="User not found")
-    id_, tg, username, points, is_vip, created_at = row[0]
-    return {"id": id_, "telegram_id": tg, "username": username, "points": points, "is_vip": bool(is_vip), "created_at": created_at}
-
-@app.post("/request/create")
-def create_request(payload: CreateRequestIn):
-    user = db_execute("SELECT id, points FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not registered")
-    owner_id, points = user[0]
-    if points < payload.points:
-        raise HTTPException(status_code=400, detail="Not enough points to post request")
-    created_at = datetime.utcnow().isoformat()
-    db_execute(
-        "INSERT INTO requests (owner_id, uid, region, proof_url, points_requested, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (owner_id, payload.uid, payload.region.upper(), str(payload.proof_url), payload.points, "open", created_at)
-    )
-    db_execute("UPDATE users SET points = points - ? WHERE id = ?", (payload.points, owner_id))
-    return {"ok": True, "message": "Request created and points staked"}
-
-@app.get("/requests/open", response_model=List[ReqOut])
-def list_open_requests():
-    rows = db_execute("SELECT id, owner_id, uid, region, proof_url, points_requested, status, created_at, claimed_by FROM requests WHERE status = 'open' ORDER BY created_at DESC", fetch=True)
-    return [
-        {
-            "id": r[0], "owner_id": r[1], "uid": r[2],
-            "region": r[3], "proof_url": r[4],
-            "points_requested": r[5], "status": r[6],
-            "claimed_by": r[8], "created_at": r[7]
-        } for r in rows
-    ]
-
-@app.post("/request/claim")
-def claim(payload: ClaimIn):
-    req = db_execute("SELECT id, status, owner_id FROM requests WHERE id = ?", (payload.request_id,), fetch=True)
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
-    r_id, status, owner_id = req[0]
-    if status != "open":
-        raise HTTPException(status_code=400, detail="Request not open")
-    claimer = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if not claimer:
-        raise HTTPException(status_code=404, detail="Claimer not registered")
-    claimer_id = claimer[0][0]
-    if claimer_id == owner_id:
-        raise HTTPException(status_code=400, detail="Owner cannot claim own request")
-    db_execute("UPDATE requests SET status = ?, claimed_by = ? WHERE id = ?", ("claimed", claimer_id, r_id))
-    return {"ok": True, "message": "Request claimed. Confirm with /request/confirm after liking"}
-
-@app.post("/request/confirm")
-def confirm(payload: ConfirmIn):
-    rows = db_execute("SELECT id, status, claimed_by, owner_id, points_requested FROM requests WHERE id = ?", (payload.request_id,), fetch=True)
-    if not rows:
-        raise HTTPException(status_code=404, detail="Request not found")
-    r_id, status, claimed_by, owner_id, points_requested = rows[0]
-    if status != "claimed":
-        raise HTTPException(status_code=400, detail="Request not in claimed state")
-    claimer = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if not claimer:
-        raise HTTPException(status_code=404, detail="Claimer not registered")
-    claimer_id = claimer[0][0]
-    if claimer_id != claimed_by:
-        raise HTTPException(status_code=403, detail="Only claimer can confirm")
-    db_execute("UPDATE requests SET status = ?, claim_proof_url = ?, completed_at = ? WHERE id = ?",
-               ("completed", str(payload.claim_proof_url), datetime.utcnow().isoformat(), r_id))
-    db_execute("UPDATE users SET points = points + ? WHERE id = ?", (points_requested, claimer_id))
-    return {"ok": True, "message": "Confirmed. Points awarded to claimer"}
-
-@app.get("/user/points/{telegram_id}")
-def get_points(telegram_id: int):
-    row = db_execute("SELECT points FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
-    if not row:
-        raise HTTPException(status_code=404, detail="User not found")
-    return {"points": row[0][0]}
-
-@app.post("/admin/add_points")
-def admin_add_points(
-    telegram_id: int = Body(...),
-    points: int = Body(...),
-    secret: str = Body(...)
-):
-    if secret != "CHANGE_THIS_SECRET":
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    row = db_execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
-    if not row:
-        raise HTTPException(status_code=404, detail="User not found")
-    db_execute("UPDATE users SET points = points + ? WHERE telegram_id = ?", (points, telegram_id))
-    return {"ok": True, "message": "Points added successfully"}    return conn
-
-DB = init_db()
-DB_LOCK = threading.Lock()
-
-def db_execute(query, params=(), fetch=False):
-    with DB_LOCK:
-        cur = DB.cursor()
-        cur.execute(query, params)
-        if fetch:
-            return cur.fetchall()
-        DB.commit()
-        return None
-
-# ---------- Schemas ----------
-class RegisterIn(BaseModel):
+class RegisterIn(msgspec.Struct):
     telegram_id: int
     username: Optional[str] = None
 
-class CreateRequestIn(BaseModel):
-    telegram_id: int
-    uid: str = Field(..., json_schema_extra={"example": "2476897412"})
-    region: str = Field(..., json_schema_extra={"example": "IND"})
-    proof_url: HttpUrl
-    points: int = Field(..., ge=1, le=100)
-
-class ClaimIn(BaseModel):
+class CreateRequestIn(msgspec.Struct):
     telegram_id: int
-    request_id: int
-
-class ConfirmIn(BaseModel):
-    telegram_id: int
-    request_id: int
-    claim_proof_url: HttpUrl
-
-class ReqOut(BaseModel):
-    id: int
-    owner_id: int
     uid: str
     region: str
-    proof_url: HttpUrl
-    points_requested: int
-    status: str
-    claimed_by: Optional[int]
-    created_at: str
-
-# ---------- Endpoints ----------
-@app.post("/register")
-def register(payload: RegisterIn):
-    user = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if user:
-        return {"ok": True, "message": "Already registered"}
-    db_execute(
-        "INSERT INTO users (telegram_id, username, created_at) VALUES (?, ?, ?)",
-        (payload.telegram_id, payload.username or "", datetime.utcnow().isoformat())
-    )
-    return {"ok": True, "message": "Registered"}
-
-@app.get("/me/{telegram_id}")
-def me(telegram_id: int):
-    row = db_execute("SELECT id, telegram_id, username, points, is_vip, created_at FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
-    if not row:
-        raise HTTPException(status_code=404, detail="User not found")
-    id_, tg, username, points, is_vip, created_at = row[0]
-    return {"id": id_, "telegram_id": tg, "username": username, "points": points, "is_vip": bool(is_vip), "created_at": created_at}
-
-@app.get("/requests/open", response_model=List[ReqOut])
-def list_open_requests():
-    rows = db_execute("SELECT id, owner_id, uid, region, proof_url, points_requested, status, created_at, claimed_by FROM requests WHERE status = 'open' ORDER BY created_at DESC", fetch=True)
-    return [
-        {
-            "id": r[0], "owner_id": r[1], "uid": r[2],
-            "region": r[3], "proof_url": r[4],
-            "points_requested": r[5], "status": r[6],
-            "claimed_by": r[8], "created_at": r[7]
-        } for r in rows
-    ]
-
-# ---------- Add remaining endpoints (create_request, claim, confirm, admin_add_points, get_points) similarly ----------    conn.commit()
-    return conn
-
-DB = init_db()
-DB_LOCK = threading.Lock()
-
-def db_execute(query, params=(), fetch=False):
-    with DB_LOCK:
-        cur = DB.cursor()
-        cur.execute(query, params)
-        if fetch:
-            rows = cur.fetchall()
-            return rows
-        DB.commit()
-        return None
-
-# ---------- Schemas ----------
-class RegisterIn(BaseModel):
-    telegram_id: int
-    username: Optional[str] = None
+    proof_url: ProofUrl
+    points: int
 
-class CreateRequestIn(BaseModel):
-    telegram_id: int
-    uid: str = Field(..., example="2476897412")
-    region: str = Field(..., example="IND")
-    proof_url: HttpUrl
-    points: int = Field(..., ge=1, le=100)
+    def __post_init__(self):
+        if not 1 <= self.points <= 100:
+            raise ValueError("points must be between 1 and 100")
+        check_proof_url("proof_url", self.proof_url)
+        self.region = self.region.upper()
 
-class ClaimIn(BaseModel):
+class ClaimIn(msgspec.Struct):
     telegram_id: int
     request_id: int
 
-class ConfirmIn(BaseModel):
+class ConfirmIn(msgspec.Struct):
     telegram_id: int
     request_id: int
-    claim_proof_url: HttpUrl
+    claim_proof_url: ProofUrl
+
+    def __post_init__(self):
+        check_proof_url("claim_proof_url", self.claim_proof_url)
+
+def body(cls):
+    async def dep(request: Request):
+        try:
+            return msgspec.json.decode(await request.body(), type=cls)
+        except msgspec.DecodeError as e:
+            raise HTTPException(status_code=422, detail=[decode_error(e)])
+    return Depends(dep)
+
+def body_openapi(cls):
+    # body() hides the payload from FastAPI, so describe it to the OpenAPI schema by hand
+    (_,), components = msgspec.json.schema_components([cls])
+    schema = components[cls.__name__]
+    return {"requestBody": {"content": {"application/json": {"schema": schema}}, "required": True}}
+
+_ERROR_PATH_RE = re.compile(r"^(.*?)(?: - at `\$(.*)`)?$", re.DOTALL)
+
+def decode_error(e):
+    # same shape as FastAPI's own validation errors: {"type", "loc", "msg"}
+    msg, path = _ERROR_PATH_RE.match(str(e)).groups()
+    loc = ["body"]
+    for name, index in re.findall(r"\.([^.\[]+)|\[(\d+)\]", path or ""):
+        loc.append(name or int(index))
+    kind = "value_error" if isinstance(e, msgspec.ValidationError) else "json_invalid"
+    return {"type": kind, "loc": loc, "msg": msg}
 
 class ReqOut(BaseModel):
     id: int
     owner_id: int
     uid: str
-    region: str
-    proof_url: HttpUrl
+    region: Optional[str]
+    proof_url: str
     points_requested: int
     status: str
     claimed_by: Optional[int]
     created_at: str
 
 # ---------- Endpoints ----------
-@app.post("/register")
-def register(payload: RegisterIn):
-    user = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if user:
+@app.post("/register", openapi_extra=body_openapi(RegisterIn))
+async def register(payload: RegisterIn = body(RegisterIn)):
+    if await resolve_user_id(payload.telegram_id) is not None:
+        return {"ok": True, "message": "Already registered"}
+    async def op(conn):
+        cur = await conn.execute(SQL_INSERT_USER, (payload.telegram_id, payload.username or ""))
+        return cur.rowcount
+    # concurrent registrations of one user can share a batch; only the first inserts
+    if not await run_write(op):
         return {"ok": True, "message": "Already registered"}
-    db_execute(
-        "INSERT INTO users (telegram_id, username, created_at) VALUES (?, ?, ?)",
-        (payload.telegram_id, payload.username or "", datetime.utcnow().isoformat())
-    )
     return {"ok": True, "message": "Registered"}
 
 @app.get("/me/{telegram_id}")
-def me(telegram_id: int):
-    row = db_execute("SELECT id, telegram_id, username, points, is_vip, created_at FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
+@cached("fflike:user:{telegram_id}:me")
+async def me(telegram_id: int):
+    row = await db_execute(SQL_GET_USER, (telegram_id,), fetch="one")
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
-    id_, tg, username, points, is_vip, created_at = row[0]
+    id_, tg, username, points, is_vip, created_at = row
     return {"id": id_, "telegram_id": tg, "username": username, "points": points, "is_vip": bool(is_vip), "created_at": created_at}
 
-@app.post("/request/create")
-def create_request(payload: CreateRequestIn):
-    # find user
-    user = db_execute("SELECT id, points FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not registered")
-    owner_id, points = user[0]
-    # cost to list is the requested points (user must have >= points)
-    if points < payload.points:
-        raise HTTPException(status_code=400, detail="Not enough points to post request")
-    created_at = datetime.utcnow().isoformat()
-    db_execute(
-        "INSERT INTO requests (owner_id, uid, region, proof_url, points_requested, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (owner_id, payload.uid, payload.region.upper(), str(payload.proof_url), payload.points, "open", created_at)
-    )
-    # deduct points immediately as stake
-    db_execute("UPDATE users SET points = points - ? WHERE id = ?", (payload.points, owner_id))
+@app.post("/request/create", openapi_extra=body_openapi(CreateRequestIn))
+async def create_request(payload: CreateRequestIn = body(CreateRequestIn)):
+    async def op(conn):
+        # find user
+        owner_id = await resolve_user_id(payload.telegram_id, conn)
+        if owner_id is None:
+            raise HTTPException(status_code=404, detail="User not registered")
+        # deduct points immediately as stake; cost to list is the requested points
+        cur = await conn.execute(SQL_DEDUCT_POINTS, (payload.points, owner_id, payload.points))
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=400, detail="Not enough points to post request")
+        # first request from a region assigns it an id
+        await conn.execute(SQL_INSERT_REGION, (payload.region,))
+        await conn.execute(
+            SQL_INSERT_REQUEST,
+            (owner_id, payload.uid, payload.region, payload.proof_url, payload.points)
+        )
+        return owner_id
+    cache_user_id(payload.telegram_id, await run_write(op))
+    await cache_invalidate(f"fflike:user:{payload.telegram_id}:me", groups=(OPEN_PAGES_KEY,))
     return {"ok": True, "message": "Request created and points staked"}
 
-@app.get("/requests/open", response_model=List[ReqOut])
-def list_open_requests():
-    rows = db_execute("SELECT id, owner_id, uid, region, proof_url, points_requested, status, created_at, claimed_by FROM requests WHERE status = 'open' ORDER BY created_at DESC", fetch=True)
-    out = []
-    for r in rows:
-        id_, owner_id, uid, region, proof_url, points_requested, status, created_at, claimed_by = r
-        out.append({
-            "id": id_, "owner_id": owner_id, "uid": uid,
-            "region": region, "proof_url": proof_url,
-            "points_requested": points_requested, "status": status,
-            "claimed_by": claimed_by, "created_at": created_at
-        })
-    return out
-
-@app.post("/request/claim")
-def claim(payload: ClaimIn):
-    # ensure request exists and open
-    req = db_execute("SELECT id, status, owner_id FROM requests WHERE id = ?", (payload.request_id,), fetch=True)
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
-    r_id, status, owner_id = req[0]
-    if status != "open":
-        raise HTTPException(status_code=400, detail="Request not open")
-    # find claimer user id
-    claimer = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if not claimer:
-        raise HTTPException(status_code=404, detail="Claimer not registered")
-    claimer_id = claimer[0][0]
-    # don't allow owner to claim own request
-    if claimer_id == owner_id:
-        raise HTTPException(status_code=400, detail="Owner cannot claim own request")
-    # mark claimed
-    db_execute("UPDATE requests SET status = ?, claimed_by = ? WHERE id = ?", ("claimed", claimer_id, r_id))
+@app.get("/requests/open", responses={200: {"model": List[ReqOut]}})
+@cached("fflike:req:open:{limit}:{offset}", group=OPEN_PAGES_KEY)
+async def list_open_requests(limit: int = Query(OPEN_PAGE_SIZE, ge=1, le=OPEN_PAGE_MAX), offset: int = Query(0, ge=0)):
+    row = await db_execute(SQL_LIST_OPEN, (limit, offset), fetch="one")
+    return Response(row[0], media_type="application/json")
+
+@app.post("/request/claim", openapi_extra=body_openapi(ClaimIn))
+async def claim(payload: ClaimIn = body(ClaimIn)):
+    async def op(conn):
+        # find claimer user id
+        claimer_id = await resolve_user_id(payload.telegram_id, conn)
+        if claimer_id is None:
+            raise HTTPException(status_code=404, detail="Claimer not registered")
+        # mark claimed if the request is open and not the claimer's own
+        cur = await conn.execute(SQL_CLAIM_REQUEST, (claimer_id, payload.request_id, claimer_id))
+        if cur.rowcount == 0:
+            # only the failure path pays for a lookup, to report why
+            cur = await conn.execute(SQL_GET_REQUEST_STATE, (payload.request_id,))
+            req = await cur.fetchone()
+            if not req:
+                raise HTTPException(status_code=404, detail="Request not found")
+            if req["status"] != STATUS_OPEN:
+                raise HTTPException(status_code=400, detail="Request not open")
+            raise HTTPException(status_code=400, detail="Owner cannot claim own request")
+        return claimer_id
+    cache_user_id(payload.telegram_id, await run_write(op))
+    await cache_invalidate(groups=(OPEN_PAGES_KEY,))
     return {"ok": True, "message": "Request claimed. After you like in-game, confirm with /request/confirm"}
 
-@app.post("/request/confirm")
-def confirm(payload: ConfirmIn):
-    # find request
-    rows = db_execute("SELECT id, status, claimed_by, owner_id, points_requested FROM requests WHERE id = ?", (payload.request_id,), fetch=True)
-    if not rows:
-        raise HTTPException(status_code=404, detail="Request not found")
-    r_id, status, claimed_by, owner_id, points_requested = rows[0]
-    if status != "claimed":
-        raise HTTPException(status_code=400, detail="Request not in claimed state")
-    # confirm only by the claimer
-    claimer = db_execute("SELECT id FROM users WHERE telegram_id = ?", (payload.telegram_id,), fetch=True)
-    if not claimer:
-        raise HTTPException(status_code=404, detail="Claimer not registered")
-    claimer_id = claimer[0][0]
-    if claimer_id != claimed_by:
-        raise HTTPException(status_code=403, detail="Only claimer can confirm")
-    # mark completed, store claim proof url and award points to claimer
-    db_execute("UPDATE requests SET status = ?, claim_proof_url = ?, completed_at = ? WHERE id = ?",
-               ("completed", str(payload.claim_proof_url), datetime.utcnow().isoformat(), r_id))
-    # award points to claimer (you can take a small fee if you want)
-    db_execute("UPDATE users SET points = points + ? WHERE id = ?", (points_requested, claimer_id))
+@app.post("/request/confirm", openapi_extra=body_openapi(ConfirmIn))
+async def confirm(payload: ConfirmIn = body(ConfirmIn)):
+    async def op(conn):
+        # confirm only by the claimer
+        claimer_id = await resolve_user_id(payload.telegram_id, conn)
+        if claimer_id is None:
+            raise HTTPException(status_code=404, detail="Claimer not registered")
+        # mark completed and store claim proof url if this claimer holds the claim
+        cur = await conn.execute(SQL_COMPLETE_REQUEST, (payload.claim_proof_url, payload.request_id, claimer_id))
+        completed = await cur.fetchone()
+        if not completed:
+            cur = await conn.execute(SQL_GET_REQUEST_STATE, (payload.request_id,))
+            req = await cur.fetchone()
+            if not req:
+                raise HTTPException(status_code=404, detail="Request not found")
+            if req["status"] != STATUS_CLAIMED:
+                raise HTTPException(status_code=400, detail="Request not in claimed state")
+            raise HTTPException(status_code=403, detail="Only claimer can confirm")
+        # award points to claimer (you can take a small fee if you want)
+        await conn.execute(SQL_AWARD_POINTS, (completed["points_requested"], claimer_id))
+        return claimer_id
+    cache_user_id(payload.telegram_id, await run_write(op))
+    await cache_invalidate(f"fflike:user:{payload.telegram_id}:me", groups=(OPEN_PAGES_KEY,))
     return {"ok": True, "message": "Confirmed. Points awarded to claimer"}
 
 @app.get("/user/points/{telegram_id}")
-def get_points(telegram_id: int):
-    row = db_execute("SELECT points FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
+async def get_points(telegram_id: int):
+    row = await db_execute(SQL_GET_POINTS, (telegram_id,), fetch="one")
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"points": row[0][0]}
+    return {"points": row[0]}
 
 # ---------- admin helpers ----------
 @app.post("/admin/add_points")
-def admin_add_points(telegram_id: int = Body(...), points: int = Body(...), secret: str = Body(...)):
-    if secret != "CHANGE_THIS_SECRET":
-        raise HTTPException(status_code=401)
-    row = db_execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,), fetch=True)
-    if not row:
+async def admin_add_points(telegram_id: int = Body(...), points: int = Body(...), secret: str = Body(...)):
+    # surrogatepass: a lone surrogate in the JSON string is a wrong secret, not a 500
+    if not hmac.compare_digest(secret.encode(errors="surrogatepass"), ADMIN_SECRET):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    async def op(conn):
+        cur = await conn.execute(SQL_ADD_POINTS_BY_TG, (points, telegram_id))
+        return await cur.fetchone()
+    # the RETURNING row doubles as the existence check
+    if await run_write(op) is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db_execute("UPDATE users SET points = points + ? WHERE telegram_id = ?", (points, telegram_id))
-    return {"ok": True}
+    await cache_invalidate(f"fflike:user:{telegram_id}:me")
+    return {"ok": True, "message": "Points added successfully"}
 
 # ---------- simple bootstrap ----------
 if __name__ == "__main__":
     import uvicorn
     print("Starting like-exchange API on http://127.0.0.1:8000")
-    uvicorn.run("like_api:app", host="0.0.0.0", port=8000, reload=True)
+    # one process per core; WAL + busy_timeout let the workers share the SQLite file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=os.cpu_count(), loop="uvloop", http="httptools", reload=False)
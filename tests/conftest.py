@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# main reads its config at import time
+os.environ.setdefault("ADMIN_SECRET", "test-secret")
+os.environ.pop("REDIS_URL", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def db_dir(tmp_path, monkeypatch):
+    # DB_FILE is relative, so every test gets its own database
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,58 @@
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_failing_op_does_not_undo_the_rest_of_its_batch():
+    async def scenario():
+        main.init_db()
+        conn = await main.connect(writer=True)
+        queue = asyncio.Queue()
+        task = asyncio.create_task(main.writer(conn, queue))
+
+        async def failing(conn):
+            await conn.execute(main.SQL_INSERT_USER, (1, "rolled back"))
+            raise HTTPException(status_code=400, detail="nope")
+
+        async def succeeding(conn):
+            cur = await conn.execute(main.SQL_INSERT_USER, (2, "kept"))
+            return cur.rowcount
+
+        # both are queued before the writer runs, so they share one batch
+        loop = asyncio.get_running_loop()
+        failed, succeeded = loop.create_future(), loop.create_future()
+        queue.put_nowait((failing, failed))
+        queue.put_nowait((succeeding, succeeded))
+        results = await asyncio.gather(failed, succeeded, return_exceptions=True)
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        cur = await conn.execute("SELECT telegram_id, username FROM users")
+        rows = [tuple(row) for row in await cur.fetchall()]
+        await conn.close()
+        return results, rows
+
+    (error, rowcount), rows = asyncio.run(scenario())
+    assert isinstance(error, HTTPException) and error.status_code == 400
+    assert rowcount == 1
+    assert rows == [(2, "kept")]
+
+
+def test_writes_get_503_once_the_writer_stops():
+    with TestClient(main.app) as client:
+        assert client.post("/register", json={"telegram_id": 1}).status_code == 200
+        # a broken connection kills the writer on its next batch
+        client.portal.call(main.app.state.write_conn.close)
+
+        in_flight = client.post("/register", json={"telegram_id": 2})
+        assert in_flight.status_code == 503
+        assert main.app.state.writer_task.done()
+
+        after = client.post("/register", json={"telegram_id": 3})
+        assert after.status_code == 503
+        assert after.json() == {"detail": "Database writer unavailable"}
+        # reads don't need the writer
+        assert client.get("/me/1").status_code == 200